@@ -1,8 +1,9 @@
-from typing import Iterator, TextIO, Tuple
+from concurrent import futures
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple, Union
 
 import docutils
 
-from . import rstfmt
+from . import rst_extras, rstfmt
 
 
 def _dump_lines(node: docutils.nodes.Node) -> Iterator[Tuple[int, str]]:
@@ -34,13 +35,20 @@ def text_contents(node: docutils.nodes.Node) -> str:
 
 
 def node_eq(d1: docutils.nodes.Node, d2: docutils.nodes.Node) -> bool:
-    if type(d1) is not type(d2):
-        print("different type")
-        return False
+    # Walk the trees with an explicit stack so deeply nested documents don't hit the recursion
+    # limit.
+    stack = [(d1, d2)]
+    while stack:
+        d1, d2 = stack.pop()
+        if type(d1) is not type(d2):
+            print("different type")
+            return False
+
+        if isinstance(d1, docutils.nodes.Text):
+            if d1.astext().split() != d2.astext().split():
+                return False
+            continue
 
-    if isinstance(d1, docutils.nodes.Text):
-        return bool(d1.astext().split() == d2.astext().split())
-    else:
         sentinel = object()
         for k in ["name", "refname", "refuri"]:
             if d1.attributes.get(k, sentinel) != d2.attributes.get(k, sentinel):
@@ -49,53 +57,111 @@ def node_eq(d1: docutils.nodes.Node, d2: docutils.nodes.Node) -> bool:
                 print(d2.attributes)
                 return False
 
-    if isinstance(d1, docutils.nodes.literal_block):
-        if "python" in d1["classes"]:
-            import black
-
-            # Check that either the outputs are equal or both calls to Black fail to parse.
-            t1 = t2 = object()
-            try:
-                t1 = black.format_str(text_contents(d1), mode=black.FileMode())
-            except black.InvalidInput:
-                pass
-            try:
-                t2 = black.format_str(text_contents(d2), mode=black.FileMode())
-            except black.InvalidInput:
-                pass
-            return bool(t1 == t2)
-
-    if len(d1.children) != len(d2.children):
-        print("different num children")
-        for i, c in enumerate(d1.children):
-            print(1, i, c)
-        for i, c in enumerate(d2.children):
-            print(2, i, c)
-        return False
-    return all(node_eq(c1, c2) for c1, c2 in zip(d1.children, d2.children))
-
-
-def run_test(doc: docutils.nodes.document) -> None:
+        if isinstance(d1, docutils.nodes.literal_block):
+            if "python" in d1["classes"]:
+                import black
+
+                # Check that either the outputs are equal or both calls to Black fail to parse.
+                t1 = t2 = object()
+                try:
+                    t1 = black.format_str(text_contents(d1), mode=black.FileMode())
+                except black.InvalidInput:
+                    pass
+                try:
+                    t2 = black.format_str(text_contents(d2), mode=black.FileMode())
+                except black.InvalidInput:
+                    pass
+                if t1 != t2:
+                    return False
+                continue
+
+        if len(d1.children) != len(d2.children):
+            print("different num children")
+            for i, c in enumerate(d1.children):
+                print(1, i, c)
+            for i, c in enumerate(d2.children):
+                print(2, i, c)
+            return False
+        # Push in reverse so children are compared in document order.
+        stack.extend(reversed(list(zip(d1.children, d2.children))))
+    return True
+
+
+test_widths = [1, 2, 3, 5, 8, 13, 34, 55, 89, 144, 72, None]
+
+
+def check_width(
+    doc: docutils.nodes.document,
+    width: Optional[int],
+    cache: Optional[Dict[docutils.nodes.Node, List[Any]]] = None,
+) -> None:
+    output = rstfmt.format_node(width, doc, cache)
+    doc2 = rstfmt.parse_string(output)
+    output2 = rstfmt.format_node(width, doc2)
+
+    try:
+        assert node_eq(doc, doc2)
+        assert output == output2
+    except AssertionError as e:
+        # Several widths may fail at once when testing in parallel, so keep their dumps apart.
+        suffix = f"-{width}.txt"
+        with open("/tmp/dump1" + suffix, "w") as f:
+            dump_node(doc, f)
+        with open("/tmp/dump2" + suffix, "w") as f:
+            dump_node(doc2, f)
+
+        with open("/tmp/out1" + suffix, "w") as f:
+            print(output, file=f)
+        with open("/tmp/out2" + suffix, "w") as f:
+            print(output2, file=f)
+
+        raise AssertionError(
+            f"Inconsistent output at width {width}; see /tmp/{{dump,out}}{{1,2}}{suffix}"
+        ) from e
+
+
+def _check_widths_of_source(s: str, widths: List[Optional[int]]) -> None:
+    # Parsed documents can't be sent to worker processes, since directive nodes hold instances of
+    # classes created on the fly by `rst_extras`, so each worker parses the source for itself.
+    #
+    # Unpickling SystemMessage objects is broken, and trying to do it breaks the whole pool, so
+    # convert failures to parse the output into ordinary test failures.
+    rst_extras.register()
+    doc = rstfmt.parse_string(s)
+
+    cache: Dict[docutils.nodes.Node, List[Any]] = {}
+    for width in widths:
+        try:
+            check_width(doc, width, cache)
+        except docutils.utils.SystemMessage as e:
+            raise AssertionError(f"Failed to parse output at width {width}: {e}")
+
+
+def run_test(
+    doc: Union[str, docutils.nodes.document],
+    pool: Optional[futures.Executor] = None,
+    workers: int = 1,
+) -> None:
+    """
+    Check that formatting the document at a range of widths gives output that parses to the same
+    tree and formats to itself.
+
+    If a pool is given, the widths are split into as many chunks as it has workers, each of which
+    parses the document once and checks its widths in turn. That requires the document to be given
+    as source text, which should already be known to parse.
+    """
+    if pool is not None:
+        if not isinstance(doc, str):
+            raise TypeError("Testing in parallel requires the source text of the document")
+        n = max(1, min(len(test_widths), workers))
+        results = [pool.submit(_check_widths_of_source, doc, test_widths[i::n]) for i in range(n)]
+        for r in results:
+            r.result()
+        return
+
     if isinstance(doc, str):
         doc = rstfmt.parse_string(doc)
 
-    for width in [1, 2, 3, 5, 8, 13, 34, 55, 89, 144, 72, None]:
-        output = rstfmt.format_node(width, doc)
-        doc2 = rstfmt.parse_string(output)
-        output2 = rstfmt.format_node(width, doc2)
-
-        try:
-            assert node_eq(doc, doc2)
-            assert output == output2
-        except AssertionError:
-            with open("/tmp/dump1.txt", "w") as f:
-                dump_node(doc, f)
-            with open("/tmp/dump2.txt", "w") as f:
-                dump_node(doc2, f)
-
-            with open("/tmp/out1.txt", "w") as f:
-                print(output, file=f)
-            with open("/tmp/out2.txt", "w") as f:
-                print(output2, file=f)
-
-            raise
+    cache: Dict[docutils.nodes.Node, List[Any]] = {}
+    for width in test_widths:
+        check_width(doc, width, cache)
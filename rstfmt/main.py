@@ -1,7 +1,9 @@
 import argparse
 import contextlib
+import os
 import sys
-from typing import Any, ContextManager, TextIO, cast
+from concurrent import futures
+from typing import Any, ContextManager, Optional, TextIO, cast
 
 from . import debug, rst_extras, rstfmt
 
@@ -32,38 +34,49 @@ def main() -> None:
     STDIN = "-"
     misformatted = []
 
-    for fn in args.files or [STDIN]:
-        cm = cast(ContextManager[TextIO], nullcontext(sys.stdin) if fn == STDIN else open(fn))
-
-        with cm as f:
-            inp = f.read()
-        doc = rstfmt.parse_string(inp)
-
-        if args.verbose:
-            print("=" * 60, fn, file=sys.stderr)
-            debug.dump_node(doc, sys.stderr)
-
-        if args.test:
-            try:
-                debug.run_test(doc)
-            except AssertionError as e:
-                raise AssertionError(f"Failed consistency test on {fn}!") from e
-            continue
-
-        output = rstfmt.format_node(args.width, doc)
-
-        if args.check:
-            if output != inp:
-                misformatted.append("Standard input" if fn == STDIN else fn)
-            continue
-
-        if fn != STDIN:
-            cm = open(fn, "w")
-        else:
-            cm = nullcontext(sys.stdout)
-
-        with cm as f:
-            f.write(output)
+    # The consistency test checks each file at many widths, which can be done in parallel when
+    # there's more than one CPU to do it on.
+    workers = os.cpu_count() or 1
+    pool_cm = cast(
+        ContextManager[Optional[futures.Executor]],
+        (futures.ProcessPoolExecutor(workers) if args.test and workers > 1 else nullcontext()),
+    )
+
+    with pool_cm as pool:
+        for fn in args.files or [STDIN]:
+            cm = cast(ContextManager[TextIO], nullcontext(sys.stdin) if fn == STDIN else open(fn))
+
+            with cm as f:
+                inp = f.read()
+            doc = rstfmt.parse_string(inp)
+
+            if args.verbose:
+                print("=" * 60, fn, file=sys.stderr)
+                debug.dump_node(doc, sys.stderr)
+
+            if args.test:
+                try:
+                    if pool is None:
+                        debug.run_test(doc)
+                    else:
+                        debug.run_test(inp, pool, workers)
+                except AssertionError as e:
+                    raise AssertionError(f"Failed consistency test on {fn}!") from e
+                continue
+
+            if args.check:
+                if rstfmt.format_node(args.width, doc) != inp:
+                    misformatted.append("Standard input" if fn == STDIN else fn)
+                continue
+
+            if fn == STDIN:
+                rstfmt.write_node(args.width, doc, sys.stdout)
+                continue
+
+            # Finish formatting before opening the file, so an error doesn't leave it truncated.
+            output = rstfmt.format_node(args.width, doc)
+            with open(fn, "w") as f:
+                f.write(output)
 
     if misformatted:
         for fn in misformatted:
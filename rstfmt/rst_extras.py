@@ -88,7 +88,19 @@ def _subclasses(cls: Type[T]) -> Iterator[Type[T]]:
         yield from _subclasses(c)
 
 
+_registered = False
+
+
 def register() -> None:
+    """
+    Register rstfmt's roles and directives with docutils. Only the first call does anything, so it's
+    safe to call this wherever parsing might happen.
+    """
+    global _registered
+    if _registered:
+        return
+    _registered = True
+
     for r in [
         # Standard roles (https://docutils.sourceforge.io/docs/ref/rst/roles.html) that don't have
         # equivalent non-role-based markup.
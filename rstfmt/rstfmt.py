@@ -1,3 +1,5 @@
+import copy
+import functools
 import itertools
 import re
 import string
@@ -7,11 +9,13 @@ from collections import namedtuple
 from typing import (
     Any,
     Callable,
+    Dict,
     Iterable,
     Iterator,
     List,
     NamedTuple,
     Optional,
+    TextIO,
     Tuple,
     TypeVar,
     Union,
@@ -32,9 +36,15 @@ section_chars = '#*=-^"'
 max_overline_depth = 2
 
 # https://docutils.sourceforge.io/docs/ref/rst/restructuredtext.html#inline-markup-recognition-rules
-space_chars = set(string.whitespace)
-pre_markup_break_chars = space_chars | set("-:/'\"<([{")
-post_markup_break_chars = space_chars | set("-.,:;!?\\/'\")]}>")
+space_chars = frozenset(string.whitespace)
+pre_markup_break_chars = space_chars | frozenset("-:/'\"<([{")
+post_markup_break_chars = space_chars | frozenset("-.,:;!?\\/'\")]}>")
+
+# Simple reference names can consist of "alphanumerics plus isolated (no two adjacent) internal
+# hyphens, underscores, periods, colons and plus signs", according to
+# https://docutils.sourceforge.io/docs/ref/rst/restructuredtext.html#reference-names.
+simple_ref_name_re = re.compile("^[-_.:+a-zA-Z0-9]+$")
+adjacent_ref_punct_re = re.compile("[-_.:+][-_.:+]")
 
 
 # Iterator stuff.
@@ -67,11 +77,14 @@ def prepend_if_any(f: T, it: Iterator[T]) -> Iterator[T]:
 
 
 def chain_intersperse(val: T, it: Iterable[Iterable[T]]) -> Iterator[T]:
-    first = True
+    it = iter(it)
+    try:
+        x = next(it)
+    except StopIteration:
+        return
+    yield from x
     for x in it:
-        if not first:
-            yield val
-        first = False
+        yield val
         yield from x
 
 
@@ -91,6 +104,15 @@ class FormatContext(NamedTuple):
     bullet2: str
     colwidths: List[int]
     line_block_depth: int
+    # How far, and with what spaces, to indent list item bodies past the bullet and the space after
+    # it.
+    bullet_width: int = 0
+    bullet_indent: str = ""
+    # The line between rows of the current table, which only depends on the column widths.
+    row_sep: str = ""
+    # Output of formatters that don't depend on the width, saved by node when formatting the same
+    # tree repeatedly at different widths.
+    cache: Optional[Dict[docutils.nodes.Node, List[Any]]] = None
 
     def indent(self, n: int) -> "FormatContext":
         if self.width is None:
@@ -107,10 +129,13 @@ class FormatContext(NamedTuple):
         return self._replace(width=w)
 
     def with_bullet(self, bullet: str, bullet2: Optional[str] = None) -> "FormatContext":
-        return self._replace(bullet=bullet, bullet2=bullet2 or bullet)
+        w = len(bullet) + 1
+        return self._replace(
+            bullet=bullet, bullet2=bullet2 or bullet, bullet_width=w, bullet_indent=" " * w
+        )
 
     def with_colwidths(self, c: List[int]) -> "FormatContext":
-        return self._replace(colwidths=c)
+        return self._replace(colwidths=c, row_sep="+" + "+".join("-" * w for w in c) + "+")
 
 
 class inline_markup:
@@ -143,78 +168,167 @@ def split_words(item: inline_item) -> List[word_info]:
             new_words = [word_info(item, False, False, False, False, True)]
         else:
             new_words = [word_info(s, False, False, False, False, False) for s in item.split()]
-            if item:
-                if not new_words:
-                    new_words = [word_info("", False, True, True, True, True)]
-                if item[0] in space_chars:
-                    new_words[0] = new_words[0]._replace(start_space=True)
-                if item[-1] in space_chars:
-                    new_words[-1] = new_words[-1]._replace(end_space=True)
-                if item[0] in post_markup_break_chars:
-                    new_words[0] = new_words[0]._replace(start_punct=True)
-                if item[-1] in pre_markup_break_chars:
-                    new_words[-1] = new_words[-1]._replace(end_punct=True)
+            if not new_words:
+                new_words = [word_info("", False, True, True, True, True)]
+            start, end = item[0], item[-1]
+            if start in space_chars:
+                new_words[0] = new_words[0]._replace(start_space=True)
+            if end in space_chars:
+                new_words[-1] = new_words[-1]._replace(end_space=True)
+            if start in post_markup_break_chars:
+                new_words[0] = new_words[0]._replace(start_punct=True)
+            if end in pre_markup_break_chars:
+                new_words[-1] = new_words[-1]._replace(end_punct=True)
     elif isinstance(item, inline_markup):
         new_words = [word_info(s, True, False, False, False, False) for s in item.text.split()]
     return new_words
 
 
+def fill_lines(width: int, words: List[str]) -> Iterator[str]:
+    """
+    Break the words into lines of at most the given width (except for words that are too long by
+    themselves), minimizing the sum of squares of the space left at the end of each line but the
+    last.
+
+    This is the dynamic programming approach of Knuth and Plass, without their hyphenation or
+    stretchable glue. It avoids the ragged edges that greedily filling each line can leave.
+    """
+    if not words:
+        return
+
+    # ends[i] is the total length of the first i words, counting a space after each one.
+    ends = [0]
+    for w in words:
+        ends.append(ends[-1] + len(w) + 1)
+
+    # If everything fits on one line, that's always the best layout.
+    if ends[-1] - 1 <= width:
+        yield " ".join(words)
+        return
+
+    # costs[j] is the minimum cost of laying out the first j words, and starts[j] is the index of
+    # the first word on the last line of that layout. The space left on a line running from word i
+    # up to word j is `limit + ends[i]`, where `limit` depends on j; lo is the first word that a
+    # line ending at j can start with and still fit.
+    n = len(words)
+    costs = [0] * (n + 1)
+    starts = [0] * (n + 1)
+    lo = 0
+    for j in range(1, n + 1):
+        limit = width + 1 - ends[j]
+        while limit + ends[lo] < 0:
+            lo += 1
+
+        if lo == j:
+            # A word that doesn't fit on a line by itself gets one anyway.
+            costs[j] = costs[j - 1]
+            starts[j] = j - 1
+            continue
+
+        start = lo
+        if j == n:
+            # The last line costs nothing, however short it is.
+            best = costs[lo]
+            for i in range(lo + 1, j):
+                if costs[i] <= best:
+                    best = costs[i]
+                    start = i
+        else:
+            slack = limit + ends[lo]
+            best = costs[lo] + slack * slack
+            # The space left only grows as lines get shorter, so stop once that alone costs more
+            # than the best layout so far. Ties go to the shortest last line.
+            for i in range(lo + 1, j):
+                slack = limit + ends[i]
+                sq = slack * slack
+                if sq > best:
+                    break
+                if costs[i] + sq <= best:
+                    best = costs[i] + sq
+                    start = i
+        costs[j] = best
+        starts[j] = start
+
+    breaks = []
+    j = n
+    while j > 0:
+        breaks.append(j)
+        j = starts[j]
+    i = 0
+    for j in reversed(breaks):
+        yield " ".join(words[i:j])
+        i = j
+
+
+def merge_words(items: Iterable[inline_item]) -> List[str]:
+    """
+    Split the items into words, merging words across inline markup boundaries that aren't separated
+    by whitespace.
+    """
+    # The pieces of the word being built up are only joined once the next boundary is reached; until
+    # then, only the properties of its end matter for deciding how to join the next word.
+    words: List[str] = []
+    parts: List[str] = []
+    in_markup, end_space, end_punct = False, True, True
+    for word in chain(map(split_words, items)):
+        if not in_markup and word.in_markup and not end_space:
+            parts.append("" if end_punct else r"\ ")
+            parts.append(word.text)
+            in_markup, end_space, end_punct = True, False, False
+        elif in_markup and not word.in_markup and not word.start_space:
+            parts.append("" if word.start_punct else r"\ ")
+            parts.append(word.text)
+            in_markup, end_space, end_punct = False, word.end_space, word.end_punct
+        else:
+            words.append("".join(parts))
+            parts = [word.text]
+            in_markup, end_space, end_punct = word.in_markup, word.end_space, word.end_punct
+    words.append("".join(parts))
+
+    return [w for w in words if w]
+
+
 def wrap_text(width: Optional[int], items: Iterable[inline_item]) -> Iterator[str]:
     if width is not None and width <= 0:
         raise ValueError(f"Invalid width {width}")
 
     items = list(items)
-    raw_words = list(chain(map(split_words, items)))
-
-    words = [word_info("", False, True, True, True, True)]
-    for word in raw_words:
-        last = words[-1]
-        if not last.in_markup and word.in_markup and not last.end_space:
-            join = "" if last.end_punct else r"\ "
-            words[-1] = word_info(last.text + join + word.text, True, False, False, False, False)
-        elif last.in_markup and not word.in_markup and not word.start_space:
-            join = "" if word.start_punct else r"\ "
-            words[-1] = word_info(
-                last.text + join + word.text,
-                False,
-                False,
-                word.end_space,
-                word.start_punct,
-                word.end_punct,
-            )
-        else:
-            words.append(word)
-
-    word_strs = (word.text for word in words if word.text)
+    strs = [item for item in items if isinstance(item, str)]
+    if len(strs) == len(items):
+        # Without any inline markup, there's nothing to merge and the words can be used as they are.
+        word_strs = [w for item in strs for w in item.split()]
+    else:
+        word_strs = merge_words(items)
 
     if width is None:
         yield " ".join(word_strs)
         return
 
-    buf: List[str] = []
-    n = 0
-    for w in word_strs:
-        n2 = n + bool(buf) + len(w)
-        if buf and n2 > width:
-            yield " ".join(buf)
-            buf = []
-            n2 = len(w)
-        buf.append(w)
-        n = n2
-    if buf:
-        yield " ".join(buf)
+    yield from fill_lines(width, word_strs)
 
 
 def fmt_children(node: docutils.nodes.Node, ctx: FormatContext) -> Iterator[Iterator[str]]:
     return (fmt(c, ctx) for c in node.children)
 
 
+def children_text(node: docutils.nodes.Node, ctx: FormatContext) -> str:
+    return "".join([s for c in node.children for s in fmt(c, ctx)])
+
+
 def with_spaces(n: int, lines: Iterable[str]) -> Iterator[str]:
+    # This plain generator measures faster on long code blocks than either mapping a lambda over the
+    # lines or doing a single regex substitution over the whole text.
     s = " " * n
     for l in lines:
         yield s + l if l else l
 
 
+# Documents tend to use the same few roles on the same few targets over and over.
+@functools.lru_cache(maxsize=4096)
+def role_markup(role: str, text: str) -> inline_markup:
+    return inline_markup(f":{role}:`{text}`")
+
+
 def preproc(node: docutils.nodes.Node) -> None:
     """
     Do some node preprocessing that is generic across node types and is therefore most convenient to
@@ -222,18 +336,18 @@ def preproc(node: docutils.nodes.Node) -> None:
     """
     # Strip all system_message nodes. (Just formatting them with no markup isn't enough, since that
     # could lead to extra spaces or empty lines between other elements.)
-    node.children = [c for c in node.children if not isinstance(c, docutils.nodes.system_message)]
+    node.children = [c for c in node.children if type(c) is not docutils.nodes.system_message]
 
     # Match references to targets, which helps later with distinguishing whether they're anonymous.
     for a, b in pairwise(node.children):
-        if isinstance(a, docutils.nodes.reference) and isinstance(b, docutils.nodes.target):
+        if type(a) is docutils.nodes.reference and type(b) is docutils.nodes.target:
             a.attributes["target"] = b  # type: ignore
 
     # Sort contiguous blocks of targets by name.
     start = None
     for i, c in enumerate(itertools.chain(node.children, [None])):
         in_run = start is not None
-        is_target = isinstance(c, docutils.nodes.target)
+        is_target = type(c) is docutils.nodes.target
         if in_run and not is_target:
             # Anonymous targets have a value of `[]` for "names", which will sort to the top. Also,
             # it's important here that `sorted` is stable, or anonymous targets could break.
@@ -258,6 +372,10 @@ class IgnoreMessagesReporter(docutils.utils.Reporter):
     warning but parses just fine; ignoring that message means we can automatically fix lengths
     whether they're too short or too long (though they do have to be at least four characters to be
     parsed correctly in the first place).
+
+    Debug and info messages are never reported or halted on, so they're dropped without the cost of
+    formatting them. Callers may still attach the returned info message to the tree, so an empty
+    message node is returned; those get stripped in preprocessing anyway.
     """
 
     ignored_messages = {
@@ -275,6 +393,23 @@ class IgnoreMessagesReporter(docutils.utils.Reporter):
         self.halt_level = orig_level
         return msg
 
+    def debug(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def info(self, *args: Any, **kwargs: Any) -> docutils.nodes.system_message:
+        return docutils.nodes.system_message(level=self.INFO_LEVEL, type="INFO")
+
+
+# Constructing the default settings is one of the most expensive parts of parsing a document, so do
+# it once and hand each new document its own copy. (Parsers are cheap to make but keep the state of
+# the parse in progress, so they aren't shared.)
+_settings = docutils.frontend.OptionParser(
+    components=[docutils.parsers.rst.Parser]
+).get_default_values()
+_settings.report_level = docutils.utils.Reporter.SEVERE_LEVEL
+_settings.halt_level = docutils.utils.Reporter.WARNING_LEVEL
+_settings.file_insertion_enabled = False
+
 
 # Main stuff.
 
@@ -325,29 +460,25 @@ class Formatters:
     def substitution_reference(
         node: docutils.nodes.substitution_reference, ctx: FormatContext
     ) -> inline_iterator:
-        c = chain(fmt_children(node, ctx))
-        x = inline_markup("|" + "".join(c) + "|")
-        yield x
+        yield inline_markup("|" + children_text(node, ctx) + "|")
 
     @staticmethod
     def emphasis(node: docutils.nodes.emphasis, ctx: FormatContext) -> inline_iterator:
-        yield inline_markup("*" + "".join(chain(fmt_children(node, ctx))).replace("*", "\\*") + "*")
+        yield inline_markup("*" + children_text(node, ctx).replace("*", "\\*") + "*")
 
     @staticmethod
     def strong(node: docutils.nodes.strong, ctx: FormatContext) -> inline_iterator:
-        yield inline_markup(
-            "**" + "".join(chain(fmt_children(node, ctx))).replace("*", "\\*") + "**"
-        )
+        yield inline_markup("**" + children_text(node, ctx).replace("*", "\\*") + "**")
 
     @staticmethod
     def literal(node: docutils.nodes.literal, ctx: FormatContext) -> inline_iterator:
-        yield inline_markup("``" + "".join(chain(fmt_children(node, ctx))) + "``")
+        yield inline_markup("``" + children_text(node, ctx) + "``")
 
     @staticmethod
     def title_reference(
         node: docutils.nodes.title_reference, ctx: FormatContext
     ) -> inline_iterator:
-        yield inline_markup("`" + "".join(chain(fmt_children(node, ctx))) + "`")
+        yield inline_markup("`" + children_text(node, ctx) + "`")
 
     # Basic lists.
     @staticmethod
@@ -379,10 +510,9 @@ class Formatters:
         if not node.children:
             yield "-"
             return
-        w = len(ctx.bullet) + 1
         b = ctx.bullet + " "
-        s = " " * w
-        ctx = ctx.indent(w)
+        s = ctx.bullet_indent
+        ctx = ctx.indent(ctx.bullet_width)
         for first, c in enum_first(chain_intersperse("", fmt_children(node, ctx))):
             yield ((b if first else s) if c else "") + c
 
@@ -400,9 +530,9 @@ class Formatters:
         node: docutils.nodes.definition_list_item, ctx: FormatContext
     ) -> line_iterator:
         for c in node.children:
-            if isinstance(c, docutils.nodes.term):
+            if type(c) is docutils.nodes.term:
                 yield from fmt(c, ctx)
-            elif isinstance(c, docutils.nodes.definition):
+            elif type(c) is docutils.nodes.definition:
                 yield from with_spaces(3, fmt(c, ctx.indent(3)))
 
     @staticmethod
@@ -471,7 +601,9 @@ class Formatters:
             sub_doc = parse_string("\n".join(d.content))
             if sub_doc.children:
                 yield ""
-                yield from with_spaces(3, fmt(sub_doc, ctx.indent(3)))
+                # The content is parsed afresh each time, so cached output for it would never be
+                # reused.
+                yield from with_spaces(3, fmt(sub_doc, ctx.indent(3)._replace(cache=None)))
 
     @staticmethod
     def section(node: docutils.nodes.section, ctx: FormatContext) -> line_iterator:
@@ -488,39 +620,34 @@ class Formatters:
             chain_intersperse("", fmt_children(entry, ctx.with_width(w - 2)))
             for entry, w in zip(node.children, ctx.colwidths)
         ]
-        for line_group in itertools.zip_longest(*all_lines):
-            yield "|" + "|".join(
-                " " + (line or "").ljust(w - 2) + " " for line, w in zip(line_group, ctx.colwidths)
-            ) + "|"
+        inner_widths = [w - 2 for w in ctx.colwidths]
+        for line_group in itertools.zip_longest(*all_lines, fillvalue=""):
+            yield "| " + " | ".join(
+                line.ljust(w) for line, w in zip(line_group, inner_widths)
+            ) + " |"
 
     @staticmethod
     def tbody(node: docutils.nodes.tbody, ctx: FormatContext) -> line_iterator:
-        sep = "+" + "+".join("-" * w for w in ctx.colwidths) + "+"
-        yield from chain_intersperse(sep, fmt_children(node, ctx))
+        yield from chain_intersperse(ctx.row_sep, fmt_children(node, ctx))
 
     thead = tbody
 
     @staticmethod
     def tgroup(node: docutils.nodes.tgroup, ctx: FormatContext) -> line_iterator:
         ctx = ctx.with_colwidths(
-            [
-                c.attributes["colwidth"]
-                for c in node.children
-                if isinstance(c, docutils.nodes.colspec)
-            ]
+            [c.attributes["colwidth"] for c in node.children if type(c) is docutils.nodes.colspec]
         )
-        sep = "+" + "+".join("-" * w for w in ctx.colwidths) + "+"
-
-        yield sep
+        yield ctx.row_sep
         for c in node.children:
-            if isinstance(c, docutils.nodes.colspec):
+            t = type(c)
+            if t is docutils.nodes.colspec:
                 continue
-            if isinstance(c, docutils.nodes.thead):
+            if t is docutils.nodes.thead:
                 yield from fmt(c, ctx)
                 yield "+" + "+".join("=" * w for w in ctx.colwidths) + "+"
-            if isinstance(c, docutils.nodes.tbody):
+            if t is docutils.nodes.tbody:
                 yield from fmt(c, ctx)
-                yield sep
+                yield ctx.row_sep
 
     @staticmethod
     def table(node: docutils.nodes.table, ctx: FormatContext) -> line_iterator:
@@ -625,27 +752,23 @@ class Formatters:
 
         # Handle references that are also substitution references.
         if len(children) == 1 and isinstance(children[0], docutils.nodes.substitution_reference):
-            anonymous = bool(attrs.get("anonymous"))
-            yield inline_markup(title + anon_suffix(anonymous))
+            yield inline_markup(title + anon_suffix(bool(attrs.get("anonymous"))))
             return
 
+        # References that weren't matched with a following target in preprocessing are anonymous.
+        anonymous = "target" not in attrs
+
         # Handle references to external URIs. They can be either standalone hyperlinks, written as
         # just the URI, or an explicit "`text <url>`_" or "`text <url>`__".
-        if "refuri" in attrs:
-            uri = attrs["refuri"]
+        uri = attrs.get("refuri")
+        if uri is not None:
             if uri == title or uri == "mailto:" + title:
                 yield inline_markup(title)
             else:
-                anonymous = "target" not in attrs
                 yield inline_markup(f"`{title} <{uri}>`{anon_suffix(anonymous)}")
             return
 
-        # Simple reference names can consist of "alphanumerics plus isolated (no two adjacent)
-        # internal hyphens, underscores, periods, colons and plus signs", according to
-        # https://docutils.sourceforge.io/docs/ref/rst/restructuredtext.html#reference-names.
-        is_single_word = re.match("^[-_.:+a-zA-Z0-9]+$", title) and not re.search(
-            "[-_.:+][-_.:+]", title
-        )
+        is_single_word = simple_ref_name_re.match(title) and not adjacent_ref_punct_re.search(title)
 
         # "x__" is one of the few cases to trigger an explicit "anonymous" attribute (the other
         # being the similar "|x|__", which is already handled above).
@@ -655,7 +778,6 @@ class Formatters:
             yield inline_markup(title + anon_suffix(True))
             return
 
-        anonymous = "target" not in attrs
         ref = attrs["refname"]
         # Check whether the reference name matches the text and can be made implicit. (Reference
         # names are case-insensitive.)
@@ -669,7 +791,7 @@ class Formatters:
 
     @staticmethod
     def role(node: docutils.nodes.Node, ctx: FormatContext) -> inline_iterator:
-        yield inline_markup(f":{node.attributes['role']}:`{node.attributes['text']}`")
+        yield role_markup(node.attributes["role"], node.attributes["text"])
 
     @staticmethod
     def ref_role(node: docutils.nodes.Node, ctx: FormatContext) -> inline_iterator:
@@ -713,7 +835,7 @@ class Formatters:
         lang = langs[0] if langs else None
         yield ".. code::" + (" " + lang if lang else "")
         yield ""
-        text = "".join(chain(fmt_children(node, ctx)))
+        text = children_text(node, ctx)
 
         try:
             func = getattr(CodeFormatters, lang)
@@ -725,31 +847,67 @@ class Formatters:
         yield from with_spaces(3, text.split("\n"))
 
 
+# Formatters by node type name, looked up once here instead of by attribute access on every node.
+# Going through getattr also unwraps the staticmethods, so dispatch calls the plain functions.
+_formatters: Dict[str, Callable[[Any, FormatContext], Iterator[str]]] = {
+    name: getattr(Formatters, name) for name in vars(Formatters) if not name.startswith("_")
+}
+
+
+# Formatters whose output never depends on the width, and so can be reused across widths.
+_width_independent = {"comment", "literal_block", "target", "title"}
+
+
 def fmt(node: docutils.nodes.Node, ctx: FormatContext) -> Iterator[str]:
+    name = type(node).__name__
     try:
-        func = getattr(Formatters, type(node).__name__)
-    except AttributeError:
-        raise ValueError(f"Unknown node type {type(node).__name__}!")
-    return func(node, ctx)  # type: ignore
+        func = _formatters[name]
+    except KeyError:
+        raise ValueError(f"Unknown node type {name}!")
+    if ctx.cache is None or name not in _width_independent:
+        return func(node, ctx)
+    try:
+        lines = ctx.cache[node]
+    except KeyError:
+        lines = ctx.cache[node] = list(func(node, ctx))
+    return iter(lines)
 
 
-def format_node(width: Optional[int], node: docutils.nodes.Node) -> str:
+def _root_context(
+    width: Optional[int], cache: Optional[Dict[docutils.nodes.Node, List[Any]]] = None
+) -> FormatContext:
     if width is not None and width <= 0:
         width = None
-    return "\n".join(fmt(node, FormatContext(0, width, "", "", [], 0))) + "\n"
+    return FormatContext(0, width, "", "", [], 0, cache=cache)
+
+
+def format_node(
+    width: Optional[int],
+    node: docutils.nodes.Node,
+    cache: Optional[Dict[docutils.nodes.Node, List[Any]]] = None,
+) -> str:
+    """
+    Format the given node to the given width.
+
+    If a cache dict is given, it's used to save the output of parts of the tree that don't depend on
+    the width, so it should only be shared between calls that format the same tree.
+    """
+    return "\n".join(fmt(node, _root_context(width, cache))) + "\n"
+
+
+def write_node(width: Optional[int], node: docutils.nodes.Node, file: TextIO) -> None:
+    """
+    Format the given node to the given width, writing lines to the file as they're produced instead
+    of building up the whole output first. The output is the same as that of `format_node`.
+    """
+    file.writelines(intersperse("\n", fmt(node, _root_context(width))))
+    file.write("\n")
 
 
 def parse_string(s: str) -> docutils.nodes.document:
-    parser = docutils.parsers.rst.Parser()
-    settings = docutils.frontend.OptionParser(
-        components=[docutils.parsers.rst.Parser]
-    ).get_default_values()
-    settings.report_level = docutils.utils.Reporter.SEVERE_LEVEL
-    settings.halt_level = docutils.utils.Reporter.WARNING_LEVEL
-    settings.file_insertion_enabled = False
-    doc = docutils.utils.new_document("", settings=settings)
-    doc.reporter = IgnoreMessagesReporter("", settings.report_level, settings.halt_level)
-    parser.parse(s, doc)
+    doc = docutils.utils.new_document("", settings=copy.copy(_settings))
+    doc.reporter = IgnoreMessagesReporter("", _settings.report_level, _settings.halt_level)
+    docutils.parsers.rst.Parser().parse(s, doc)
     preproc(doc)
 
     return doc
@@ -17,6 +17,8 @@ class ParseError(Exception):
 
 
 def do_format(width: int, s: str) -> str:
+    # Worker processes that don't start by forking haven't had the registration done in `main`.
+    rst_extras.register()
     # Unpickling SystemMessage objects is broken for some reason, so raising them directly fails;
     # replace them with our own sentinel class.
     try: